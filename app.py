@@ -2,27 +2,41 @@
 Context Cruncher - Gradio Application
 Extract structured context data from voice recordings using Gemini AI.
 """
+import asyncio
 import gradio as gr
 import os
-from pathlib import Path
-import tempfile
+from typing import AsyncIterator
+from gradio.processing_utils import save_bytes_to_cache
 from gemini_processor import (
-    process_audio_with_gemini,
+    stream_audio_with_gemini,
     create_markdown_file,
     create_json_file
 )
 
+# Maximum number of extraction requests processed at the same time
+CONCURRENCY_LIMIT = 4
 
-def process_audio(
+# Maximum number of requests waiting in the queue before new ones are rejected
+QUEUE_MAX_SIZE = 32
+
+# Every hour, delete cached download files older than an hour
+# (Gradio keeps them forever by default)
+DOWNLOAD_CACHE_CLEANUP = (3600, 3600)
+
+
+async def process_audio(
     audio_input,
     uploaded_file,
     api_key: str,
     user_identification: str,
     user_name: str = ""
-) -> tuple:
+) -> AsyncIterator[tuple]:
     """
     Process audio from either recording or upload.
 
+    Partial context is yielded while Gemini streams the extraction, followed
+    by the final result once both output files are ready.
+
     Args:
         audio_input: Audio from microphone recording
         uploaded_file: Uploaded audio file
@@ -30,18 +44,19 @@ def process_audio(
         user_identification: "name" or "user"
         user_name: User's name if using name identification
 
-    Returns:
+    Yields:
         Tuple of (markdown_content, markdown_file, json_file, status_message)
     """
     try:
         # Validate API key
         if not api_key or api_key.strip() == "":
-            return (
+            yield (
                 "",
                 None,
                 None,
                 "Error: Please provide a Gemini API key"
             )
+            return
 
         # Determine which audio source to use
         audio_path = None
@@ -51,32 +66,48 @@ def process_audio(
             audio_path = uploaded_file.name
 
         if audio_path is None:
-            return (
+            yield (
                 "",
                 None,
                 None,
                 "Error: Please record audio or upload an audio file"
             )
+            return
 
         # Determine user reference
         user_ref = None
         if user_identification == "name":
             if not user_name or user_name.strip() == "":
-                return (
+                yield (
                     "",
                     None,
                     None,
                     "Error: Please provide your name when using name identification"
                 )
+                return
             user_ref = user_name.strip()
 
-        # Process with Gemini
-        status_msg = "Processing audio with Gemini API..."
-        context_markdown, human_readable_name, snake_case_filename = process_audio_with_gemini(
+        # Show progress straight away rather than a blank status box
+        yield (
+            "",
+            None,
+            None,
+            "Sending audio to Gemini..."
+        )
+
+        # Process with Gemini, showing the context as it streams in
+        async for context_markdown, human_readable_name, snake_case_filename in stream_audio_with_gemini(
             audio_path,
             api_key,
             user_ref
-        )
+        ):
+            if human_readable_name is None:
+                yield (
+                    context_markdown,
+                    None,
+                    None,
+                    "Streaming context..."
+                )
 
         # Create output files
         md_filename, md_content = create_markdown_file(
@@ -91,26 +122,26 @@ def process_audio(
             snake_case_filename
         )
 
-        # Write files to temp directory for download
-        temp_dir = tempfile.mkdtemp()
-        md_path = Path(temp_dir) / md_filename
-        json_path = Path(temp_dir) / json_filename
-
-        with open(md_path, 'w') as f:
-            f.write(md_content)
-
-        with open(json_path, 'w') as f:
-            f.write(json_content)
+        # Write the bytes straight into Gradio's cache so it serves them
+        # without re-hashing and copying a temp file
+        md_path, json_path = await asyncio.gather(
+            asyncio.to_thread(
+                save_bytes_to_cache, md_content.encode(), md_filename, demo.GRADIO_CACHE
+            ),
+            asyncio.to_thread(
+                save_bytes_to_cache, json_content.encode(), json_filename, demo.GRADIO_CACHE
+            )
+        )
 
-        return (
+        yield (
             md_content,
-            str(md_path),
-            str(json_path),
+            md_path,
+            json_path,
             f"Success! Context extracted: {human_readable_name}"
         )
 
     except Exception as e:
-        return (
+        yield (
             "",
             None,
             None,
@@ -147,7 +178,11 @@ custom_css = """
 """
 
 # Create Gradio interface
-with gr.Blocks(css=custom_css, title="Context Cruncher") as demo:
+with gr.Blocks(
+    css=custom_css,
+    title="Context Cruncher",
+    delete_cache=DOWNLOAD_CACHE_CLEANUP
+) as demo:
     gr.Markdown(
         """
         # Context Cruncher
@@ -277,7 +312,7 @@ with gr.Blocks(css=custom_css, title="Context Cruncher") as demo:
                 ## Technical Details
 
                 - **AI Model**: Gemini 2.0 Flash (multimodal audio understanding)
-                - **Processing**: Direct audio file upload to Gemini API
+                - **Processing**: Recordings under 19MB are sent inline; larger ones are uploaded via the Gemini Files API
                 - **Output Formats**: Markdown and JSON
 
                 ## Use Cases
@@ -315,9 +350,11 @@ with gr.Blocks(css=custom_css, title="Context Cruncher") as demo:
             markdown_download,
             json_download,
             status_output
-        ]
+        ],
+        concurrency_limit=CONCURRENCY_LIMIT
     )
 
 
 if __name__ == "__main__":
+    demo.queue(max_size=QUEUE_MAX_SIZE, default_concurrency_limit=CONCURRENCY_LIMIT)
     demo.launch()
@@ -1,12 +1,410 @@
 """
 Gemini API integration for processing audio and extracting context data.
 """
+import asyncio
+import contextlib
+import functools
+import google.ai.generativelanguage as glm
 import google.generativeai as genai
+import hashlib
+import itertools
 import json
-from datetime import datetime
-from typing import Dict, Tuple
+import mimetypes
+import mmap
+import os
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from pathlib import Path
+from google.api_core.client_options import ClientOptions
+from google.api_core.exceptions import ResourceExhausted
+from google.generativeai.client import FileServiceClient
+from google.generativeai.types.file_types import File
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# The first section header doubles as the context title
+_FIRST_HEADER_RE = re.compile(r'^##[ \t]+(.+)$', re.M)
+
+# Runs of characters that are not allowed in a snake_case filename
+_SLUG_RE = re.compile(r'[^a-z0-9]+')
+
+# Fallback naming when the context has no section header
+DEFAULT_HUMAN_READABLE_NAME = "Context Data"
+DEFAULT_SNAKE_CASE_FILENAME = "context_data"
+
+# Use Gemini Pro 2.5 with audio understanding
+MODEL_NAME = 'gemini-2.0-flash-exp'
+
+# Free-tier Gemini allows 15 requests per minute per API key; queue locally
+# rather than hit 429s
+RATE_LIMIT_REQUESTS = 15
+RATE_LIMIT_PERIOD = 60.0
+MAX_CONCURRENT_REQUESTS = 2
+
+# Retries for requests that are still rejected with 429 Resource Exhausted
+MAX_RETRIES = 5
+MAX_RETRY_DELAY = 30.0
+
+# Recordings below this size are sent inline instead of via the Files API
+# (Gemini caps inline requests at 20MB including the prompt)
+INLINE_AUDIO_MAX_BYTES = 19_000_000
+
+# Uploaded files expire after 48h; don't reuse handles that are about to lapse
+UPLOAD_EXPIRY_MARGIN = timedelta(minutes=10)
+
+# Chunk size used when hashing audio for the upload cache
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Rate limiter and semaphore per API key
+# (keyed on the event loop too, since asyncio primitives bind to one loop)
+_REQUEST_LIMITS: Dict[
+    Tuple[str, asyncio.AbstractEventLoop],
+    "_RequestLimits"
+] = {}
+
+# Uploaded files keyed on (api_key, sha256 of the audio)
+_UPLOAD_CACHE: Dict[Tuple[str, str], Any] = {}
+_UPLOAD_CACHE_LOCK = threading.Lock()
+
+_KEY_CYCLE_LOCK = threading.Lock()
+
+
+def _split_api_keys(api_keys: str) -> List[str]:
+    """
+    Split a comma-separated list of API keys.
+
+    Args:
+        api_keys: One or more comma-separated Gemini API keys
+
+    Returns:
+        List of individual keys
+    """
+    return [key.strip() for key in api_keys.split(',') if key.strip()]
+
+
+@functools.lru_cache(maxsize=8)
+def _get_key_cycle(api_keys: str) -> Iterator[str]:
+    """
+    Get a round-robin iterator over a comma-separated list of API keys.
+
+    Args:
+        api_keys: One or more comma-separated Gemini API keys
+
+    Returns:
+        Iterator cycling through the individual keys
+    """
+    return itertools.cycle(_split_api_keys(api_keys))
+
+
+def _next_api_key(api_keys: str) -> str:
+    """
+    Pick the API key for the next request.
+
+    Multiple comma-separated keys are used in turn so that the per-key
+    free-tier quota is spread across all of them.
+
+    Args:
+        api_keys: One or more comma-separated Gemini API keys
+
+    Returns:
+        A single Gemini API key
+
+    Raises:
+        ValueError: If no key is given
+    """
+    if not _split_api_keys(api_keys):
+        raise ValueError("No Gemini API key provided")
+
+    if ',' not in api_keys:
+        return api_keys.strip()
+
+    with _KEY_CYCLE_LOCK:
+        return next(_get_key_cycle(api_keys))
+
+
+class _RateLimiter:
+    """Token bucket that spaces requests out to stay under a per-period limit."""
+
+    def __init__(self, max_requests: int, period: float):
+        self._capacity = max_requests
+        self._refill_rate = max_requests / period
+        self._tokens = float(max_requests)
+        self._last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a request may be sent."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._capacity,
+                    self._tokens + (now - self._last_refill) * self._refill_rate
+                )
+                self._last_refill = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self._refill_rate)
+
+    def is_full(self) -> bool:
+        """Whether the bucket has refilled completely and nobody is waiting."""
+        if self._lock.locked():
+            return False
+        elapsed = time.monotonic() - self._last_refill
+        return self._tokens + elapsed * self._refill_rate >= self._capacity
+
+
+class _RequestLimits:
+    """Rate limiter and concurrency semaphore for one API key."""
+
+    def __init__(self):
+        self.rate_limiter = _RateLimiter(RATE_LIMIT_REQUESTS, RATE_LIMIT_PERIOD)
+        self.semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        self.active_requests = 0
+
+    def is_idle(self) -> bool:
+        """Whether these limits are indistinguishable from fresh ones."""
+        return self.active_requests == 0 and self.rate_limiter.is_full()
+
+
+def _get_request_limits(api_key: str) -> _RequestLimits:
+    """
+    Get the rate limiter and concurrency semaphore for an API key.
+
+    Idle entries are pruned when a new key is added. An idle entry is
+    identical to a fresh one, so pruning never resets a key's quota.
+
+    Args:
+        api_key: Gemini API key
+
+    Returns:
+        Request limits for the key on the running event loop
+    """
+    limits_key = (api_key, asyncio.get_running_loop())
+    limits = _REQUEST_LIMITS.get(limits_key)
+    if limits is None:
+        for key, existing in list(_REQUEST_LIMITS.items()):
+            if key[1].is_closed() or existing.is_idle():
+                del _REQUEST_LIMITS[key]
+
+        limits = _RequestLimits()
+        _REQUEST_LIMITS[limits_key] = limits
+    return limits
+
+
+@contextlib.asynccontextmanager
+async def _generate_content(
+    api_key: str,
+    contents: list,
+    **kwargs: Any
+) -> AsyncIterator[Any]:
+    """
+    Call generate_content_async with client-side rate limiting.
+
+    Requests wait for a rate limit token and a concurrency slot for their API
+    key, and are retried with exponential backoff if Gemini still returns 429.
+    The slot is held until the context exits, so a streamed response counts
+    against the limit until it has been fully read.
+
+    Args:
+        api_key: Gemini API key
+        contents: Prompt contents
+        **kwargs: Extra arguments for generate_content_async
+
+    Yields:
+        Gemini response (async iterable when stream=True)
+    """
+    model = _get_model(api_key)
+    limits = _get_request_limits(api_key)
+
+    # Counted from the start of waiting so the entry isn't pruned while in use
+    limits.active_requests += 1
+    try:
+        async with limits.semaphore:
+            for attempt in range(MAX_RETRIES):
+                await limits.rate_limiter.acquire()
+                try:
+                    response = await model.generate_content_async(contents, **kwargs)
+                    break
+                except ResourceExhausted:
+                    if attempt == MAX_RETRIES - 1:
+                        raise
+                    await asyncio.sleep(min(2 * 2 ** attempt, MAX_RETRY_DELAY))
+
+            yield response
+    finally:
+        limits.active_requests -= 1
+
+
+def _get_model(api_key: str) -> genai.GenerativeModel:
+    """
+    Get a cached Gemini model bound to its own client for an API key.
+
+    genai.configure sets a single process-wide key, which concurrent users
+    with different keys would race on. Each model instead gets a client
+    created with its key, and reusing the model keeps that client's
+    connections alive across requests.
+
+    Args:
+        api_key: Gemini API key
+
+    Returns:
+        Gemini model using the given key
+    """
+    # The async gRPC channel is tied to the loop it was created on
+    return _get_loop_model(api_key, asyncio.get_running_loop())
+
+
+@functools.lru_cache(maxsize=8)
+def _get_loop_model(
+    api_key: str,
+    loop: asyncio.AbstractEventLoop
+) -> genai.GenerativeModel:
+    """
+    Create a Gemini model for an API key on a specific event loop.
+
+    Args:
+        api_key: Gemini API key
+        loop: Event loop the model's client will be used on
+
+    Returns:
+        Gemini model using the given key
+    """
+    model = genai.GenerativeModel(MODEL_NAME)
+    # The model only falls back to the global client when this is unset
+    model._async_client = glm.GenerativeServiceAsyncClient(
+        client_options=ClientOptions(api_key=api_key)
+    )
+    return model
+
+
+@functools.lru_cache(maxsize=8)
+def _get_file_client(api_key: str) -> FileServiceClient:
+    """
+    Get a cached Files API client for an API key.
+
+    Args:
+        api_key: Gemini API key
+
+    Returns:
+        File service client using the given key
+    """
+    return FileServiceClient(client_options=ClientOptions(api_key=api_key))
 
 
+def _hash_file(path: str) -> str:
+    """
+    Compute the SHA256 digest of a file without reading it all into memory.
+
+    The file is memory-mapped and hashed in chunks, so large recordings are
+    paged in by the OS rather than copied into Python buffers.
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        # mmap cannot map empty files
+        if os.fstat(f.fileno()).st_size == 0:
+            return digest.hexdigest()
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for offset in range(0, len(mm), HASH_CHUNK_BYTES):
+                    digest.update(view[offset:offset + HASH_CHUNK_BYTES])
+            finally:
+                view.release()
+
+    return digest.hexdigest()
+
+
+def _upload_audio(audio_file_path: str, api_key: str) -> Any:
+    """
+    Upload an audio file, reusing an earlier upload of identical content.
+
+    Args:
+        audio_file_path: Path to the audio file
+        api_key: Gemini API key the file is uploaded under
+
+    Returns:
+        Uploaded Gemini file handle
+    """
+    cache_key = (api_key, _hash_file(audio_file_path))
+    valid_after = datetime.now(timezone.utc) + UPLOAD_EXPIRY_MARGIN
+
+    with _UPLOAD_CACHE_LOCK:
+        cached = _UPLOAD_CACHE.get(cache_key)
+    if cached is not None and cached.expiration_time > valid_after:
+        return cached
+
+    audio_file = File(_get_file_client(api_key).create_file(
+        path=Path(audio_file_path),
+        mime_type=_guess_audio_mime_type(audio_file_path),
+        display_name=Path(audio_file_path).name
+    ))
+
+    with _UPLOAD_CACHE_LOCK:
+        # Drop expired handles so the cache doesn't grow without bound
+        for key, handle in list(_UPLOAD_CACHE.items()):
+            if handle.expiration_time <= valid_after:
+                del _UPLOAD_CACHE[key]
+        _UPLOAD_CACHE[cache_key] = audio_file
+
+    return audio_file
+
+
+def _guess_audio_mime_type(audio_file_path: str) -> str:
+    """
+    Guess the MIME type of an audio file in the form Gemini expects.
+
+    Args:
+        audio_file_path: Path to the audio file
+
+    Returns:
+        MIME type string
+    """
+    mime_type = mimetypes.guess_type(audio_file_path)[0] or "audio/ogg"
+    if mime_type == "audio/x-wav":
+        mime_type = "audio/wav"
+    return mime_type
+
+
+def _prepare_audio(audio_file_path: str, api_key: str) -> Any:
+    """
+    Build the audio part of the request.
+
+    Short recordings are sent inline, which saves the separate upload
+    request. Larger ones go through the Files API.
+
+    Args:
+        audio_file_path: Path to the audio file
+        api_key: Gemini API key the file is uploaded under
+
+    Returns:
+        Inline audio part or uploaded Gemini file handle
+    """
+    if os.path.getsize(audio_file_path) >= INLINE_AUDIO_MAX_BYTES:
+        return _upload_audio(audio_file_path, api_key)
+
+    with open(audio_file_path, 'rb') as f:
+        return {"mime_type": _guess_audio_mime_type(audio_file_path), "data": f.read()}
+
+
+@functools.lru_cache(maxsize=32)
 def get_system_prompt(user_name: str = None) -> str:
     """
     Generate the system prompt for context extraction.
@@ -57,75 +455,107 @@ Follow a careful hierarchical structure that allows additional context to be eas
 Now process the provided audio recording and extract the context data following these guidelines."""
 
 
-def get_naming_prompt() -> str:
-    """Get the prompt for generating context data names."""
-    return """Based on the context data you just extracted, provide a JSON object with:
-1. human_readable_name: A clear, descriptive title for this context (e.g., "Medical History and Medications", "Movie Preferences")
-2. snake_case_filename: A snake_case version suitable for a filename (e.g., "medical_history_medications", "movie_preferences")
+def _first_header_title(context_markdown: str) -> Optional[str]:
+    """
+    Get the text of the first section header in the context.
+
+    Args:
+        context_markdown: The extracted context data
+
+    Returns:
+        Header text, or None if there is no non-empty section header
+    """
+    match = _FIRST_HEADER_RE.search(context_markdown)
+    if not match:
+        return None
+
+    return match.group(1).strip().strip('#').strip() or None
+
+
+def derive_context_name(context_markdown: str) -> Tuple[str, str]:
+    """
+    Derive a title and filename from the first section header of the context.
+
+    Args:
+        context_markdown: The extracted context data
 
-Respond ONLY with a valid JSON object in this exact format:
-{
-  "human_readable_name": "Your Title Here",
-  "snake_case_filename": "your_filename_here"
-}"""
+    Returns:
+        Tuple of (human_readable_name, snake_case_filename)
+    """
+    human_readable_name = _first_header_title(context_markdown)
+    if human_readable_name is None:
+        return DEFAULT_HUMAN_READABLE_NAME, DEFAULT_SNAKE_CASE_FILENAME
 
+    snake_case_filename = _SLUG_RE.sub('_', human_readable_name.lower()).strip('_')
 
-def process_audio_with_gemini(
+    return human_readable_name, snake_case_filename or DEFAULT_SNAKE_CASE_FILENAME
+
+
+async def stream_audio_with_gemini(
     audio_file_path: str,
     api_key: str,
     user_name: str = None
-) -> Tuple[str, str, str]:
+) -> AsyncIterator[Tuple[str, Optional[str], Optional[str]]]:
     """
-    Process audio file with Gemini API to extract context data.
+    Stream context extraction from an audio file with Gemini API.
 
     Args:
         audio_file_path: Path to the audio file
-        api_key: Gemini API key
+        api_key: Gemini API key, or several comma-separated keys to rotate through
         user_name: Optional user name for personalization
 
-    Returns:
-        Tuple of (context_markdown, human_readable_name, snake_case_filename)
+    Yields:
+        (context_markdown_so_far, None, None) while extraction streams, then
+        (context_markdown, human_readable_name, snake_case_filename) once done
 
     Raises:
         Exception: If API call fails
     """
-    genai.configure(api_key=api_key)
-
-    # Use Gemini Pro 2.5 with audio understanding
-    model = genai.GenerativeModel('gemini-2.0-flash-exp')
+    # The uploaded file belongs to the key's project, so use one key throughout
+    api_key = _next_api_key(api_key)
 
-    # Upload the audio file
-    audio_file = genai.upload_file(audio_file_path)
+    # Read or upload the audio file off the event loop
+    audio_file = await asyncio.to_thread(_prepare_audio, audio_file_path, api_key)
 
-    # Generate context data
+    # Stream context data
     system_prompt = get_system_prompt(user_name)
-    response = model.generate_content([system_prompt, audio_file])
-    context_markdown = response.text
+    context_markdown = ""
+    async with _generate_content(
+        api_key,
+        [system_prompt, audio_file],
+        stream=True
+    ) as response:
+        async for chunk in response:
+            context_markdown += chunk.text
+            yield context_markdown, None, None
 
-    # Generate naming information
-    naming_response = model.generate_content([
-        context_markdown,
-        get_naming_prompt()
-    ])
+    human_readable_name, snake_case_filename = derive_context_name(context_markdown)
+    yield context_markdown, human_readable_name, snake_case_filename
 
-    # Parse the JSON response
-    try:
-        # Extract JSON from response (handle potential markdown code blocks)
-        naming_text = naming_response.text.strip()
-        if naming_text.startswith('```'):
-            # Remove markdown code block markers
-            lines = naming_text.split('\n')
-            naming_text = '\n'.join(lines[1:-1])
 
-        naming_data = json.loads(naming_text)
-        human_readable_name = naming_data['human_readable_name']
-        snake_case_filename = naming_data['snake_case_filename']
-    except (json.JSONDecodeError, KeyError) as e:
-        # Fallback to generic naming if parsing fails
-        human_readable_name = "Context Data"
-        snake_case_filename = "context_data"
+async def process_audio_with_gemini(
+    audio_file_path: str,
+    api_key: str,
+    user_name: str = None
+) -> Tuple[str, str, str]:
+    """
+    Process audio file with Gemini API to extract context data.
+
+    Args:
+        audio_file_path: Path to the audio file
+        api_key: Gemini API key, or several comma-separated keys to rotate through
+        user_name: Optional user name for personalization
+
+    Returns:
+        Tuple of (context_markdown, human_readable_name, snake_case_filename)
+
+    Raises:
+        Exception: If API call fails
+    """
+    async for result in stream_audio_with_gemini(audio_file_path, api_key, user_name):
+        pass
 
-    return context_markdown, human_readable_name, snake_case_filename
+    return result
 
 
 def create_markdown_file(
@@ -146,9 +576,12 @@ def create_markdown_file(
     """
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    content = f"""## {human_readable_name}
+    # Don't repeat the title when it was taken from the context's own header
+    title_header = f"## {human_readable_name}\n\n"
+    if _first_header_title(context_markdown) == human_readable_name:
+        title_header = ""
 
-{context_markdown}
+    content = f"""{title_header}{context_markdown}
 
 ---
 
@@ -185,5 +618,8 @@ def create_json_file(
     }
 
     filename = f"{snake_case_filename}.json"
-    json_content = json.dumps(data, indent=2)
+    if orjson is not None:
+        json_content = orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+    else:
+        json_content = json.dumps(data, indent=2)
     return filename, json_content
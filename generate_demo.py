@@ -1,8 +1,12 @@
 """
-Generate demo results by processing the example audio file.
+Generate demo results by processing the example audio files.
 """
+import argparse
+import asyncio
+import glob
 import os
 from pathlib import Path
+from typing import List
 from gemini_processor import (
     process_audio_with_gemini,
     create_markdown_file,
@@ -13,26 +17,26 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-def main():
-    # Get API key from environment
-    api_key = os.getenv('GEMINI_API')
-    if not api_key:
-        raise ValueError("GEMINI_API not found in .env file")
-
-    # Path to example audio
-    audio_path = "example-data/movie-prefs.opus"
+# Default example audio
+EXAMPLE_AUDIO_GLOB = "example-data/*.opus"
 
-    print(f"Processing {audio_path}...")
+# Where demo results are written
+DEMO_DIR = Path("demo-results")
 
-    # Process with Gemini (using "user" identification)
-    context_markdown, human_readable_name, snake_case_filename = process_audio_with_gemini(
-        audio_path,
-        api_key,
-        user_name=None  # Use "the user" format
-    )
 
-    print(f"Extracted context: {human_readable_name}")
+async def save_results(
+    context_markdown: str,
+    human_readable_name: str,
+    snake_case_filename: str
+) -> None:
+    """
+    Write markdown and JSON results to the demo-results directory.
 
+    Args:
+        context_markdown: The extracted context data
+        human_readable_name: Human readable title
+        snake_case_filename: Filename
+    """
     # Create output files
     md_filename, md_content = create_markdown_file(
         context_markdown,
@@ -47,22 +51,71 @@ def main():
     )
 
     # Create demo-results directory
-    demo_dir = Path("demo-results")
-    demo_dir.mkdir(exist_ok=True)
+    DEMO_DIR.mkdir(exist_ok=True)
 
     # Write files
-    md_path = demo_dir / md_filename
-    json_path = demo_dir / json_filename
+    md_path = DEMO_DIR / md_filename
+    json_path = DEMO_DIR / json_filename
 
-    with open(md_path, 'w') as f:
-        f.write(md_content)
+    await asyncio.gather(
+        asyncio.to_thread(md_path.write_text, md_content, encoding="utf-8"),
+        asyncio.to_thread(json_path.write_text, json_content, encoding="utf-8")
+    )
     print(f"Saved: {md_path}")
-
-    with open(json_path, 'w') as f:
-        f.write(json_content)
     print(f"Saved: {json_path}")
 
+
+async def process_file(
+    audio_path: str,
+    api_key: str
+) -> None:
+    """
+    Extract context from one audio file and save the results.
+
+    Args:
+        audio_path: Path to the audio file
+        api_key: Gemini API key(s)
+    """
+    print(f"Processing {audio_path}...")
+
+    # Process with Gemini (using "user" identification)
+    context_markdown, human_readable_name, snake_case_filename = await process_audio_with_gemini(
+        audio_path,
+        api_key,
+        user_name=None  # Use "the user" format
+    )
+
+    print(f"Extracted context: {human_readable_name}")
+
+    await save_results(context_markdown, human_readable_name, snake_case_filename)
+
+
+async def main(audio_paths: List[str]):
+    # Get API key from environment
+    api_key = os.getenv('GEMINI_API')
+    if not api_key:
+        raise ValueError("GEMINI_API not found in .env file")
+
+    if not audio_paths:
+        audio_paths = sorted(glob.glob(EXAMPLE_AUDIO_GLOB))
+
+    # All files share one event loop, so the cached Gemini client is reused.
+    # Concurrency is bounded per key by the Gemini request limiter, so
+    # throughput scales with the number of keys in GEMINI_API.
+    await asyncio.gather(
+        *(process_file(audio_path, api_key) for audio_path in audio_paths)
+    )
+
     print("\nDemo results generated successfully!")
 
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "audio_paths",
+        nargs="*",
+        help="Audio files to process (defaults to example-data/*.opus)"
+    )
+    args = parser.parse_args()
+
+    asyncio.run(main(args.audio_paths))